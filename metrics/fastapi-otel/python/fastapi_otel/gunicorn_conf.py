@@ -0,0 +1,34 @@
+"""
+gunicorn_conf.py
+
+Gunicorn settings for serving an app with one Uvicorn worker per CPU, so a
+CPU spike in one event loop doesn't stall requests on the others. Each
+worker caps in-flight connections at 1000, like `python fast.py` does.
+
+Metrics caveat: the OTel PrometheusMetricReader keeps its histograms in the
+worker process and has no multiprocess support (prometheus_client's
+PROMETHEUS_MULTIPROC_DIR mode only aggregates native prometheus_client
+metrics). With more than one worker, each /metrics scrape reports a single
+worker's numbers, so set GUNICORN_WORKERS=1 wherever /metrics is scraped.
+
+Run:
+  gunicorn -c gunicorn_conf.py fast:app
+"""
+
+import multiprocessing
+import os
+
+from uvicorn.workers import UvicornWorker
+
+
+class BoundedUvicornWorker(UvicornWorker):
+    # Gunicorn's worker_connections is ignored by UvicornWorker, so bound
+    # concurrency through uvicorn's own setting instead
+    CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS, "limit_concurrency": 1000}
+
+
+bind = "0.0.0.0:8000"
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+worker_class = "gunicorn_conf.BoundedUvicornWorker"
+keepalive = 30
+accesslog = "-"
@@ -0,0 +1,156 @@
+"""
+intermediate.py
+
+The bottleneck app with only the minimum fix applied, sitting between
+slow.py and fast.py:
+- Slow "DB" call (async sleep 400ms)
+- Heavy "CPU" work, but run in Starlette's threadpool instead of on the
+  event loop, so other requests' awaits aren't stalled behind it
+- Background job also slow (sleep 1200ms)
+
+Run:
+  uvicorn intermediate:app --reload --port 8002
+
+Requires:
+  pip install fastapi uvicorn \
+    opentelemetry-api opentelemetry-sdk opentelemetry-exporter-otlp \
+    opentelemetry-instrumentation-fastapi opentelemetry-instrumentation-asgi \
+    opentelemetry-exporter-prometheus prometheus-client
+"""
+
+import asyncio
+import os
+import time
+
+import uvicorn
+from fastapi import BackgroundTasks, FastAPI
+from opentelemetry import metrics, trace
+from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+from opentelemetry.exporter.prometheus import PrometheusMetricReader
+from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from prometheus_client import make_asgi_app
+from starlette.concurrency import run_in_threadpool
+
+RESOURCE = Resource.create({"service.name": "fastapi-demo-intermediate"})
+
+trace_provider = TracerProvider(
+    resource=RESOURCE,
+    sampler=ParentBased(
+        TraceIdRatioBased(float(os.getenv("OTEL_TRACES_SAMPLER_ARG", "0.05")))
+    ),
+)
+otlp_traces_endpoint = os.getenv(
+    "OTEL_EXPORTER_OTLP_TRACES_ENDPOINT",
+    "http://jaeger:4317",
+)
+
+trace_exporter = OTLPSpanExporter(endpoint=otlp_traces_endpoint)
+trace_provider.add_span_processor(
+    BatchSpanProcessor(
+        trace_exporter,
+        max_queue_size=int(os.getenv("OTEL_BSP_MAX_QUEUE_SIZE", "4096")),
+        schedule_delay_millis=int(os.getenv("OTEL_BSP_SCHEDULE_DELAY", "1000")),
+        max_export_batch_size=int(os.getenv("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", "256")),
+        export_timeout_millis=int(os.getenv("OTEL_BSP_EXPORT_TIMEOUT", "10000")),
+    )
+)
+trace.set_tracer_provider(trace_provider)
+tracer = trace.get_tracer(__name__)
+
+metric_reader = PrometheusMetricReader()
+meter_provider = MeterProvider(resource=RESOURCE, metric_readers=[metric_reader])
+metrics.set_meter_provider(meter_provider)
+meter = metrics.get_meter(__name__)
+
+request_latency_ms = meter.create_histogram(
+    name="http.server.request_duration",
+    unit="ms",
+    description="End-to-end request duration measured in handler",
+)
+
+bg_job_duration_ms = meter.create_histogram(
+    name="background.job.duration",
+    unit="ms",
+    description="Background job duration",
+)
+
+# Bounded metric attributes, reused on every record
+_ATTRS_ITEMS = {"route": "/items/{item_id}"}
+_ATTRS_BG_SLOW = {"task.type": "slow"}
+
+
+app = FastAPI(title="FastAPI OTel Demo (Intermediate)")
+FastAPIInstrumentor.instrument_app(app)
+
+app.mount("/metrics", make_asgi_app())
+
+
+async def slow_db_call_async() -> None:
+    with tracer.start_as_current_span("db.query"):
+        # Simulate a slow dependency
+        await asyncio.sleep(0.4)
+
+
+def cpu_heavy_blocking_work() -> int:
+    """
+    Same heavy loop as slow.py. Still holds the GIL while it runs, but the
+    caller moves it off the event loop thread.
+    """
+    with tracer.start_as_current_span("cpu.work.blocking"):
+        total = 0
+        for i in range(7_000_000):
+            total += i
+        return total
+
+
+def slow_background_job(task_id: str) -> None:
+    start = time.perf_counter()
+    with tracer.start_as_current_span("background.job") as span:
+        span.set_attribute("task.id", task_id)
+        # Simulate slow background work
+        time.sleep(1.2)
+
+    duration_ms = (time.perf_counter() - start) * 1000.0
+    bg_job_duration_ms.record(duration_ms, attributes=_ATTRS_BG_SLOW)
+
+
+@app.get("/items/{item_id}")
+async def get_item(item_id: int) -> dict:
+    start = time.perf_counter()
+
+    with tracer.start_as_current_span("handler.get_item") as span:
+        span.set_attribute("item.id", item_id)
+
+        await slow_db_call_async()
+
+        # Minimum fix: run the blocking CPU work in the threadpool
+        _ = await run_in_threadpool(cpu_heavy_blocking_work)
+
+        # A little extra async wait to create mixed async timing in trace
+        with tracer.start_as_current_span("post.processing"):
+            await asyncio.sleep(0.1)
+
+    duration_ms = (time.perf_counter() - start) * 1000.0
+    request_latency_ms.record(duration_ms, attributes=_ATTRS_ITEMS)
+    return {"item_id": item_id, "status": "ok", "mode": "intermediate"}
+
+
+@app.post("/process/{task_id}")
+async def process(task_id: str, background_tasks: BackgroundTasks) -> dict:
+    # Kick off slow background work
+    background_tasks.add_task(slow_background_job, task_id)
+    return {"status": "queued", "task_id": task_id, "mode": "intermediate"}
+
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "intermediate:app",
+        host="0.0.0.0",
+        port=8000,
+        access_log=True,
+    )
@@ -24,25 +24,39 @@ import time
 import uvicorn
 from fastapi import BackgroundTasks, FastAPI
 from opentelemetry import metrics, trace
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
 from opentelemetry.exporter.prometheus import PrometheusMetricReader
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 from opentelemetry.sdk.metrics import MeterProvider
 from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
 from prometheus_client import make_asgi_app
 
 RESOURCE = Resource.create({"service.name": "fastapi-demo-bottlenecks"})
 
-trace_provider = TracerProvider(resource=RESOURCE)
+trace_provider = TracerProvider(
+    resource=RESOURCE,
+    sampler=ParentBased(
+        TraceIdRatioBased(float(os.getenv("OTEL_TRACES_SAMPLER_ARG", "0.05")))
+    ),
+)
 otlp_traces_endpoint = os.getenv(
     "OTEL_EXPORTER_OTLP_TRACES_ENDPOINT",
-    "http://jaeger:4318/v1/traces",
+    "http://jaeger:4317",
 )
 
 trace_exporter = OTLPSpanExporter(endpoint=otlp_traces_endpoint)
-trace_provider.add_span_processor(BatchSpanProcessor(trace_exporter))
+trace_provider.add_span_processor(
+    BatchSpanProcessor(
+        trace_exporter,
+        max_queue_size=int(os.getenv("OTEL_BSP_MAX_QUEUE_SIZE", "4096")),
+        schedule_delay_millis=int(os.getenv("OTEL_BSP_SCHEDULE_DELAY", "1000")),
+        max_export_batch_size=int(os.getenv("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", "256")),
+        export_timeout_millis=int(os.getenv("OTEL_BSP_EXPORT_TIMEOUT", "10000")),
+    )
+)
 trace.set_tracer_provider(trace_provider)
 tracer = trace.get_tracer(__name__)
 
@@ -63,6 +77,10 @@ bg_job_duration_ms = meter.create_histogram(
     description="Background job duration",
 )
 
+# Bounded metric attributes, reused on every record
+_ATTRS_ITEMS = {"route": "/items/{item_id}"}
+_ATTRS_BG_SLOW = {"task.type": "slow"}
+
 
 app = FastAPI(title="FastAPI OTel Demo (Bottlenecks)")
 FastAPIInstrumentor.instrument_app(app)
@@ -90,19 +108,19 @@ def cpu_heavy_blocking_work() -> int:
 
 
 def slow_background_job(task_id: str) -> None:
-    start = time.time()
+    start = time.perf_counter()
     with tracer.start_as_current_span("background.job") as span:
         span.set_attribute("task.id", task_id)
         # Simulate slow background work
         time.sleep(1.2)
 
-    duration_ms = (time.time() - start) * 1000.0
-    bg_job_duration_ms.record(duration_ms, attributes={"task.type": "slow"})
+    duration_ms = (time.perf_counter() - start) * 1000.0
+    bg_job_duration_ms.record(duration_ms, attributes=_ATTRS_BG_SLOW)
 
 
 @app.get("/items/{item_id}")
 async def get_item(item_id: int) -> dict:
-    start = time.time()
+    start = time.perf_counter()
 
     with tracer.start_as_current_span("handler.get_item") as span:
         span.set_attribute("item.id", item_id)
@@ -116,8 +134,8 @@ async def get_item(item_id: int) -> dict:
         with tracer.start_as_current_span("post.processing"):
             await asyncio.sleep(0.1)
 
-    duration_ms = (time.time() - start) * 1000.0
-    request_latency_ms.record(duration_ms, attributes={"route": "/items/{item_id}"})
+    duration_ms = (time.perf_counter() - start) * 1000.0
+    request_latency_ms.record(duration_ms, attributes=_ATTRS_ITEMS)
     return {"item_id": item_id, "status": "ok", "mode": "bottlenecks"}
 
 